@@ -3,44 +3,56 @@ from __future__ import annotations
 
 import argparse
 import re
-
-WORKFLOW_NOISE_PATTERNS = [
-    re.compile(r"\[(ok|warn|error)\]", re.IGNORECASE),
-    re.compile(r"\bCodex\b", re.IGNORECASE),
-    re.compile(r"\bagent\b", re.IGNORECASE),
-    re.compile(
-        r"\b(repo_fetcher|repo_indexer|evidence_builder|query_builder|patent_search|patent_fetch_claims|novelty_matrix|disclosure_builder|run_report_builder|docx_renderer)(\.py)?\b",
-        re.IGNORECASE,
-    ),
-    re.compile(
-        r"\b(min_unique_patents|min_agent_queries|claims_ok_ratio|fail-on-low-recall|fail-on-empty|require-min-ok-ratio|topk)\b",
-        re.IGNORECASE,
-    ),
-]
+from copy import deepcopy
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+# Clark names for the rFonts attributes, so no qn() parsing is needed per call.
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+RFONTS_ATTRS = (f"{{{W_NS}}}ascii", f"{{{W_NS}}}hAnsi", f"{{{W_NS}}}eastAsia")
+# Theme font references win over explicit names inside the same rFonts element.
+RFONTS_THEME_ATTRS = (f"{{{W_NS}}}asciiTheme", f"{{{W_NS}}}hAnsiTheme", f"{{{W_NS}}}eastAsiaTheme")
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+BULLET_RE = re.compile(r"^\s*[-*]\s+")
+NUMBERED_RE = re.compile(r"^\s*(\d+)\.\s*(.*)$")
+
+# One alternation so each line costs a single regex search.
+WORKFLOW_NOISE_RE = re.compile(
+    r"\[(?:ok|warn|error)\]"
+    r"|\bCodex\b"
+    r"|\bagent\b"
+    r"|\b(?:repo_fetcher|repo_indexer|evidence_builder|query_builder|patent_search|patent_fetch_claims|novelty_matrix|disclosure_builder|run_report_builder|docx_renderer)(?:\.py)?\b"
+    r"|\b(?:min_unique_patents|min_agent_queries|claims_ok_ratio|fail-on-low-recall|fail-on-empty|require-min-ok-ratio|topk)\b",
+    re.IGNORECASE,
+)
 
 def ensure_docx():
     try:
         from docx import Document  # type: ignore
-        from docx.oxml.ns import qn  # type: ignore
-        return Document, qn
+        from docx.oxml import OxmlElement  # type: ignore
+        return Document, OxmlElement
     except Exception as e:
         raise RuntimeError("python-docx not installed. Install with: pip install python-docx") from e
 
-def set_run_font(run, font_name: str, qn) -> None:
-    run.font.name = font_name
-    r_pr = run._element.get_or_add_rPr()
-    r_fonts = r_pr.get_or_add_rFonts()
-    r_fonts.set(qn("w:ascii"), font_name)
-    r_fonts.set(qn("w:hAnsi"), font_name)
-    r_fonts.set(qn("w:eastAsia"), font_name)
-
-def apply_paragraph_font(paragraph, font_name: str, qn) -> None:
-    if not paragraph.runs:
-        paragraph.add_run("")
-    for run in paragraph.runs:
-        set_run_font(run, font_name, qn)
-
-def apply_document_style_font(doc, font_name: str, qn) -> None:
+def set_rfonts(r_fonts, font_name: str) -> None:
+    for attr in RFONTS_THEME_ATTRS:
+        r_fonts.attrib.pop(attr, None)
+    for attr in RFONTS_ATTRS:
+        r_fonts.set(attr, font_name)
+
+def build_paragraph_template(style_id: Optional[str], OxmlElement):
+    """
+    <w:p> with optional pStyle and one empty run; the font comes from the
+    style, which apply_document_style_font() has already set.
+    """
+    p = OxmlElement("w:p")
+    if style_id:
+        p.get_or_add_pPr().style = style_id
+    p.add_r()
+    return p
+
+def apply_document_style_font(doc, font_name: str) -> None:
     style_names = ["Normal", "List Bullet", "List Number"]
     style_names.extend([f"Heading {i}" for i in range(1, 10)])
     for style_name in style_names:
@@ -50,106 +62,125 @@ def apply_document_style_font(doc, font_name: str, qn) -> None:
             continue
         style.font.name = font_name
         r_pr = style._element.get_or_add_rPr()
-        r_fonts = r_pr.get_or_add_rFonts()
-        r_fonts.set(qn("w:ascii"), font_name)
-        r_fonts.set(qn("w:hAnsi"), font_name)
-        r_fonts.set(qn("w:eastAsia"), font_name)
+        set_rfonts(r_pr.get_or_add_rFonts(), font_name)
 
-def render_from_markdown(md_text: str, output_path: str, font_name: str) -> None:
-    Document, qn = ensure_docx()
+def render_from_markdown(md_text: Union[str, Iterable[str]], output_path: str, font_name: str) -> None:
+    Document, OxmlElement = ensure_docx()
     doc = Document()
-    apply_document_style_font(doc, font_name, qn)
-
-    lines = md_text.splitlines()
+    apply_document_style_font(doc, font_name)
+
+    # Paragraphs are deep-copied from one prebuilt <w:p> per style and inserted
+    # straight into the body, skipping python-docx's Paragraph/Run proxies.
+    body = doc.element.body
+    sect_pr = body.sectPr
+    templates: Dict[Optional[str], Any] = {}
+
+    def add_paragraph(text: str, style: Optional[str] = None) -> None:
+        tpl = templates.get(style)
+        if tpl is None:
+            style_id = doc.styles[style].style_id if style else None
+            tpl = templates[style] = build_paragraph_template(style_id, OxmlElement)
+        p = deepcopy(tpl)
+        if text:
+            p[-1].text = text
+        if sect_pr is not None:
+            sect_pr.addprevious(p)
+        else:
+            body.append(p)
+
+    lines = iter(md_text.splitlines() if isinstance(md_text, str) else md_text)
+    # One-slot pushback for the "13." lookahead when the next line is not consumed.
+    pending: Optional[str] = None
     in_code = False
     ordered_list_counter = 0
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+    while True:
+        if pending is not None:
+            line, pending = pending, None
+        else:
+            line = next(lines, None)
+            if line is None:
+                break
         stripped = line.strip()
 
         if stripped.startswith("```"):
             in_code = not in_code
             ordered_list_counter = 0
-            i += 1
             continue
         if in_code:
-            p = doc.add_paragraph(line)
-            apply_paragraph_font(p, font_name, qn)
-            i += 1
+            add_paragraph(line)
             continue
         if not stripped:
             ordered_list_counter = 0
-            i += 1
             continue
 
-        m = re.match(r"^(#{1,6})\s+(.*)$", line)
+        # Gate each regex on the leading character so plain prose lines, the
+        # common case, fall through without running any pattern.
+        lead = stripped[0]
+        m = HEADING_RE.match(line) if lead == "#" else None
         if m:
             ordered_list_counter = 0
             level = min(len(m.group(1)), 6)
             text = m.group(2).strip()
-            p = doc.add_heading(text, level=level)
-            apply_paragraph_font(p, font_name, qn)
-            i += 1
+            add_paragraph(text, f"Heading {level}")
             continue
 
         if line.startswith("> "):
             ordered_list_counter = 0
-            p = doc.add_paragraph(line[2:].strip())
-            apply_paragraph_font(p, font_name, qn)
-            i += 1
+            add_paragraph(line[2:].strip())
             continue
 
-        if re.match(r"^\s*[-*]\s+", line):
+        bullet = BULLET_RE.match(line) if lead == "-" or lead == "*" else None
+        if bullet:
             ordered_list_counter = 0
-            text = re.sub(r"^\s*[-*]\s+", "", line).strip()
-            p = doc.add_paragraph(text, style="List Bullet")
-            apply_paragraph_font(p, font_name, qn)
-            i += 1
+            text = line[bullet.end():].strip()
+            add_paragraph(text, "List Bullet")
             continue
 
         # Ordered list rendering:
         # 1) support "13." alone + content on next line
         # 2) renumber per contiguous list block to avoid cross-section continuation
-        num_match = re.match(r"^\s*(\d+)\.\s*(.*)$", line)
+        num_match = NUMBERED_RE.match(line) if lead.isdecimal() else None
         if num_match:
             ordered_list_counter += 1
             text = num_match.group(2).strip()
-            if not text and i + 1 < len(lines):
-                next_line = lines[i + 1].strip()
-                if next_line and not re.match(r"^\s*(\d+)\.\s*(.*)$", next_line):
-                    text = next_line
-                    i += 1
-            p = doc.add_paragraph(f"{ordered_list_counter}. {text}".strip())
-            apply_paragraph_font(p, font_name, qn)
-            i += 1
+            if not text:
+                following = next(lines, None)
+                if following is not None:
+                    next_line = following.strip()
+                    if next_line and not (next_line[0].isdecimal() and NUMBERED_RE.match(next_line)):
+                        text = next_line
+                    else:
+                        pending = following
+            add_paragraph(f"{ordered_list_counter}. {text}" if text else f"{ordered_list_counter}.")
             continue
 
         ordered_list_counter = 0
-        p = doc.add_paragraph(stripped)
-        apply_paragraph_font(p, font_name, qn)
-        i += 1
-
-    doc.save(output_path)
-
-def detect_workflow_noise(md_text: str) -> list[str]:
-    bad: list[str] = []
-    for raw_line in md_text.splitlines():
+        add_paragraph(stripped)
+
+    # Assemble the package in memory and write it out in one go instead of
+    # many small zipfile writes against the output file.
+    buf = BytesIO()
+    doc.save(buf)
+    with open(output_path, "wb") as f:
+        f.write(buf.getbuffer())
+
+def iter_markdown_lines(path: str) -> Iterator[str]:
+    # splitlines() per physical line keeps str.splitlines() boundaries (\x0c, \u2028, ...).
+    # utf-8-sig drops a leading BOM once, so the first line still parses as a heading.
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for raw in f:
+            yield from raw.splitlines()
+
+def detect_workflow_noise(md_text: Union[str, Iterable[str]], limit: int = 8) -> list[str]:
+    # Only the first `limit` distinct hits are reported, so stop scanning there.
+    uniq: Dict[str, None] = {}
+    for raw_line in (md_text.splitlines() if isinstance(md_text, str) else md_text):
         line = raw_line.strip()
-        if not line:
-            continue
-        for pat in WORKFLOW_NOISE_PATTERNS:
-            if pat.search(line):
-                bad.append(line)
+        if line and line not in uniq and WORKFLOW_NOISE_RE.search(line):
+            uniq[line] = None
+            if len(uniq) >= limit:
                 break
-    seen = set()
-    uniq: list[str] = []
-    for x in bad:
-        if x in seen:
-            continue
-        seen.add(x)
-        uniq.append(x)
-    return uniq[:8]
+    return list(uniq)
 
 def main() -> int:
     p = argparse.ArgumentParser(description="Render disclosure markdown to .docx")
@@ -158,16 +189,13 @@ def main() -> int:
     p.add_argument("--font-name", default="\u5b8b\u4f53", help="Output document font (default: Songti)")
     args = p.parse_args()
 
-    with open(args.input, "r", encoding="utf-8", errors="replace") as f:
-        text = f.read()
-
     if args.input.lower().endswith(".json"):
         raise SystemExit(
             "JSON input is not supported in docx_renderer. "
             "Run scripts/disclosure_builder.py first to generate disclosure.md."
         )
 
-    noisy_lines = detect_workflow_noise(text)
+    noisy_lines = detect_workflow_noise(iter_markdown_lines(args.input))
     if noisy_lines:
         preview = "\n".join([f"- {x}" for x in noisy_lines])
         raise SystemExit(
@@ -176,7 +204,7 @@ def main() -> int:
             f"Examples:\n{preview}"
         )
 
-    render_from_markdown(text, args.output, args.font_name)
+    render_from_markdown(iter_markdown_lines(args.input), args.output, args.font_name)
 
     print(f"[ok] written: {args.output}")
     return 0
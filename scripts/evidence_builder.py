@@ -3,13 +3,21 @@ from __future__ import annotations
 
 import argparse
 import os
-from typing import Any, Dict, List, Tuple
+import re
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import accumulate
+from operator import itemgetter
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 
 from scripts.utils.chunking import clip_line_range, merge_ranges
-from scripts.utils.io import read_json, read_lines, write_json
+from scripts.utils.io import read_json, read_lines, write_json_array
 from scripts.utils.md_outline import extract_sections_by_headings
 
 DEFAULT_MAX_CHUNK_CHARS = 8000
+READ_WORKERS = 8
+READ_TYPES = frozenset({"full", "head", "sections", "symbols", "grep_context"})
 
 def die(msg: str) -> None:
     raise SystemExit(f"[evidence_builder] {msg}")
@@ -35,35 +43,40 @@ def validate_plan(index: Dict[str, Any], plan: Dict[str, Any]) -> None:
     if len(selections) > max_files:
         die(f"selections exceed max_files: {len(selections)} > {max_files}")
 
-    indexed_paths = set()
-    size_map = {}
-    for f in index.get("files", []):
-        p = f.get("path")
-        if isinstance(p, str):
-            indexed_paths.add(p)
-            size_map[p] = int(f.get("size", 0))
-
-    has_readme = any(isinstance(s.get("path"), str) and "readme" in s["path"].lower() for s in selections)
-    if not has_readme:
-        die("reading_plan must include README (or equivalent overview doc)")
+    size_map = {
+        f["path"]: int(f.get("size", 0))
+        for f in index.get("files", [])
+        if isinstance(f.get("path"), str)
+    }
 
     entrypoints = index.get("entrypoints", [])
-    if isinstance(entrypoints, list) and entrypoints:
-        has_entry = any(s.get("path") in entrypoints for s in selections)
-        if not has_entry:
-            die("reading_plan must include at least one entrypoint from repo_index.entrypoints")
+    need_entry = isinstance(entrypoints, list) and bool(entrypoints)
 
+    # One pass over selections. Per-selection errors are held back so the
+    # README / entrypoint checks still take precedence, as before.
+    has_readme = False
+    has_entry = False
+    sel_error = None
     est_total = 0
     for sel in selections:
         path = sel.get("path")
+        if not has_readme and isinstance(path, str) and "readme" in path.lower():
+            has_readme = True
+        if need_entry and not has_entry and path in entrypoints:
+            has_entry = True
+        if sel_error is not None:
+            continue
         if not isinstance(path, str) or not path:
-            die("each selection.path must be string")
-        if path not in indexed_paths:
-            die(f"selection.path not found in repo_index: {path}")
+            sel_error = "each selection.path must be string"
+            continue
+        fsize = size_map.get(path)
+        if fsize is None:
+            sel_error = f"selection.path not found in repo_index: {path}"
+            continue
         read_type = sel.get("read_type")
-        if read_type not in {"full","head","sections","symbols","grep_context"}:
-            die(f"invalid read_type: {read_type}")
-        fsize = size_map.get(path, 0)
+        if read_type not in READ_TYPES:
+            sel_error = f"invalid read_type: {read_type}"
+            continue
         if read_type == "full":
             est = fsize
         elif read_type == "head":
@@ -72,11 +85,31 @@ def validate_plan(index: Dict[str, Any], plan: Dict[str, Any]) -> None:
             est = int(fsize * 0.4)
         est_total += est
 
+    if not has_readme:
+        die("reading_plan must include README (or equivalent overview doc)")
+    if need_entry and not has_entry:
+        die("reading_plan must include at least one entrypoint from repo_index.entrypoints")
+    if sel_error is not None:
+        die(sel_error)
+
     if est_total > max_total_chars:
         die(f"estimated chars exceed max_total_chars: {est_total} > {max_total_chars}")
 
-def slice_lines(lines: List[str], start: int, end: int) -> str:
-    start, end = clip_line_range(start, end, len(lines))
+def slice_lines(lines: List[str], start: int, end: int, total: Optional[int] = None) -> str:
+    # Inlined clip_line_range(start, end, total): clamp both ends to
+    # [1, total] (min first, so an empty file still yields line 1), then order.
+    if total is None:
+        total = len(lines)
+    if start > total:
+        start = total
+    if start < 1:
+        start = 1
+    if end > total:
+        end = total
+    if end < 1:
+        end = 1
+    if end < start:
+        start, end = end, start
     return "\n".join(lines[start-1:end])
 
 def build_item(eid: str, path: str, start: int, end: int, excerpt: str, tags: List[str], why: str, extra: Dict[str, Any]) -> Dict[str, Any]:
@@ -92,19 +125,38 @@ def build_item(eid: str, path: str, start: int, end: int, excerpt: str, tags: Li
     item.update(extra)
     return item
 
-def grep_context_ranges(lines: List[str], keywords: List[str], context: int = 30, max_hits: int = 15) -> List[Tuple[int,int]]:
-    ranges: List[Tuple[int,int]] = []
+# Lowercased file as one "\n"-joined string plus the offset of each line start.
+def lower_text_index(lines: List[str]) -> Tuple[str, List[int]]:
     lower_lines = [ln.lower() for ln in lines]
-    kw = [k.lower() for k in keywords if isinstance(k, str) and k.strip()]
+    starts = list(accumulate((len(ln) + 1 for ln in lower_lines), initial=0))
+    return "\n".join(lower_lines), starts
+
+def grep_context_ranges(
+    lines: List[str],
+    keywords: List[str],
+    context: int = 30,
+    max_hits: int = 15,
+    lower_index: Optional[Tuple[str, List[int]]] = None,
+) -> List[Tuple[int,int]]:
+    ranges: List[Tuple[int,int]] = []
+    # A keyword spanning '\n' could never match within a single line.
+    kw = [k.lower() for k in keywords if isinstance(k, str) and k.strip() and "\n" not in k]
     if not kw:
         return []
-    hits = 0
-    for i, ln in enumerate(lower_lines, start=1):
-        if any(k in ln for k in kw):
-            ranges.append((i-context, i+context))
-            hits += 1
-            if hits >= max_hits:
-                break
+    text, starts = lower_index if lower_index is not None else lower_text_index(lines)
+    # Search the whole lowercased file in C and map each hit back to its line;
+    # after a hit, resume at the next line so every line counts at most once.
+    kw_search = re.compile("|".join(map(re.escape, kw))).search
+    pos = 0
+    while True:
+        m = kw_search(text, pos)
+        if m is None:
+            break
+        i = bisect_right(starts, m.start())
+        ranges.append((i-context, i+context))
+        if len(ranges) >= max_hits:
+            break
+        pos = starts[i]
     clipped = [clip_line_range(s, e, len(lines)) for s, e in ranges]
     return merge_ranges(clipped, gap=3)
 
@@ -125,7 +177,6 @@ def main() -> int:
 
     symbol_index: Dict[str, List[Dict[str, Any]]] = index.get("symbol_index", {}) if isinstance(index.get("symbol_index"), dict) else {}
 
-    evidence: List[Dict[str, Any]] = []
     eid_counter = 1
     total_chars = 0
     max_total_chars = int(plan.get("limits", {}).get("max_total_chars", 200000))
@@ -136,95 +187,159 @@ def main() -> int:
         eid_counter += 1
         return eid
 
-    selections: List[Dict[str, Any]] = plan.get("selections", [])
-    selections = sorted(selections, key=lambda s: int(s.get("priority", 1)), reverse=True)
+    # A path can be selected several times (e.g. symbols + grep_context), so
+    # each file is read and lowercased at most once per run.
+    lines_cache: Dict[str, List[str]] = {}
+    pending_reads: Dict[str, Future] = {}
+    unsubmitted: Deque[str] = deque()
+    lower_cache: Dict[str, Tuple[str, List[int]]] = {}
+
+    def lower_index_for(abs_path: str) -> Tuple[str, List[int]]:
+        lower = lower_cache.get(abs_path)
+        if lower is None:
+            lower = lower_cache[abs_path] = lower_text_index(lines_cache[abs_path])
+        return lower
+
+    # Repeated selections of one file often share headings/keywords too.
+    sections_cache: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[int, int, str]]] = {}
+    grep_cache: Dict[Tuple[str, Tuple[str, ...], int, int], List[Tuple[int, int]]] = {}
+
+    def sections_for(abs_path: str, headings: List[str]) -> List[Tuple[int, int, str]]:
+        key = (abs_path, tuple(headings))
+        found = sections_cache.get(key)
+        if found is None:
+            found = sections_cache[key] = extract_sections_by_headings(lines_cache[abs_path], headings)
+        return found
+
+    def grep_ranges_for(abs_path: str, keywords: List[str], context: int, max_hits: int) -> List[Tuple[int, int]]:
+        key = (abs_path, tuple(keywords), context, max_hits)
+        found = grep_cache.get(key)
+        if found is None:
+            found = grep_cache[key] = grep_context_ranges(
+                lines_cache[abs_path], keywords, context=context, max_hits=max_hits,
+                lower_index=lower_index_for(abs_path),
+            )
+        return found
 
-    for sel in selections:
-        if total_chars >= max_total_chars:
-            break
-
-        path = sel.get("path")
-        read_type = sel.get("read_type", "full")
-        reason = str(sel.get("reason", ""))
-        selectors = sel.get("selectors", {}) if isinstance(sel.get("selectors"), dict) else {}
-        tags = sel.get("tags", [])
-        if not isinstance(tags, list):
-            tags = []
-        tags = [str(t) for t in tags if str(t).strip()]
-
-        abs_path = os.path.join(repo, path)
-        lines = read_lines(abs_path)
-
-        extracted: List[Tuple[int,int,str]] = []
-
-        if read_type == "full":
-            extracted.append((1, len(lines), slice_lines(lines, 1, len(lines))))
-
-        elif read_type == "head":
-            n = int(selectors.get("lines", 200))
-            extracted.append((1, min(len(lines), max(1, n)), slice_lines(lines, 1, min(len(lines), max(1, n)))))
-
-        elif read_type == "sections":
-            headings = selectors.get("headings", [])
-            if not isinstance(headings, list):
-                headings = []
-            headings = [str(h) for h in headings if str(h).strip()]
-            if headings:
-                for s, e, chunk in extract_sections_by_headings(lines, headings):
-                    extracted.append((s, e, chunk))
-            else:
-                extracted.append((1, min(len(lines), 200), slice_lines(lines, 1, min(len(lines), 200))))
-
-        elif read_type == "symbols":
-            names = selectors.get("names", [])
-            if not isinstance(names, list):
-                names = []
-            names = [str(n) for n in names if str(n).strip()]
-            spans = symbol_index.get(path, [])
-            for name in names:
-                found = None
-                for sp in spans:
-                    if sp.get("name") == name:
-                        found = sp
-                        break
-                if found and isinstance(found.get("start_line"), int) and isinstance(found.get("end_line"), int):
-                    s, e = int(found["start_line"]), int(found["end_line"])
-                    extracted.append((s, e, slice_lines(lines, s, e)))
-                else:
-                    for s, e in grep_context_ranges(lines, [name], context=25, max_hits=3):
-                        extracted.append((s, e, slice_lines(lines, s, e)))
-
-        elif read_type == "grep_context":
-            keywords = selectors.get("keywords", [])
-            if not isinstance(keywords, list):
-                keywords = []
-            keywords = [str(k) for k in keywords if str(k).strip()]
-            context = int(selectors.get("context_lines", 30))
-            for s, e in grep_context_ranges(lines, keywords, context=context, max_hits=15):
-                extracted.append((s, e, slice_lines(lines, s, e)))
-
-        for s, e, chunk in extracted:
+    selections: List[Dict[str, Any]] = plan.get("selections", [])
+    # Decorate once and sort on the int with a C-level key; the sort is stable,
+    # so equal priorities keep their plan order exactly as before.
+    decorated = [(int(sel.get("priority", 1)), sel) for sel in selections]
+    decorated.sort(key=itemgetter(0), reverse=True)
+    selections = [sel for _, sel in decorated]
+
+    # Items are written as they are built instead of collected into one list.
+    def iter_evidence() -> Iterator[Dict[str, Any]]:
+        nonlocal total_chars
+        for sel in selections:
             if total_chars >= max_total_chars:
                 break
-            chunk = chunk.strip("\\n")
-            if not chunk:
-                continue
-            if len(chunk) > args.max_chunk_chars:
-                chunk = chunk[:args.max_chunk_chars] + "\\n...[truncated]..."
-            total_chars += len(chunk)
-            evidence.append(build_item(
-                eid=next_id(),
-                path=path,
-                start=s,
-                end=e,
-                excerpt=chunk,
-                tags=tags,
-                why=reason,
-                extra={"read_type": read_type, "selectors": selectors},
-            ))
-
-    write_json(args.out, evidence)
-    print(f"[ok] evidence items: {len(evidence)}")
+
+            path = sel.get("path")
+            read_type = sel.get("read_type", "full")
+            reason = str(sel.get("reason", ""))
+            selectors = sel.get("selectors", {}) if isinstance(sel.get("selectors"), dict) else {}
+            tags = sel.get("tags", [])
+            if not isinstance(tags, list):
+                tags = []
+            tags = [str(t) for t in tags if str(t).strip()]
+
+            abs_path = os.path.join(repo, path)
+            lines = lines_cache.get(abs_path)
+            if lines is None:
+                # Prefetched below; a read error surfaces here, as it did inline.
+                submit_reads()
+                fut = pending_reads.pop(abs_path)
+                submit_reads()
+                lines = lines_cache[abs_path] = fut.result()
+            total = len(lines)
+
+            extracted: List[Tuple[int,int,str]] = []
+
+            if read_type == "full":
+                extracted.append((1, total, slice_lines(lines, 1, total, total)))
+
+            elif read_type == "head":
+                n = min(total, max(1, int(selectors.get("lines", 200))))
+                extracted.append((1, n, slice_lines(lines, 1, n, total)))
+
+            elif read_type == "sections":
+                headings = selectors.get("headings", [])
+                if not isinstance(headings, list):
+                    headings = []
+                headings = [str(h) for h in headings if str(h).strip()]
+                if headings:
+                    for s, e, chunk in sections_for(abs_path, headings):
+                        extracted.append((s, e, chunk))
+                else:
+                    extracted.append((1, min(total, 200), slice_lines(lines, 1, min(total, 200), total)))
+
+            elif read_type == "symbols":
+                names = selectors.get("names", [])
+                if not isinstance(names, list):
+                    names = []
+                names = [str(n) for n in names if str(n).strip()]
+                spans = symbol_index.get(path, [])
+                for name in names:
+                    found = None
+                    for sp in spans:
+                        if sp.get("name") == name:
+                            found = sp
+                            break
+                    if found and isinstance(found.get("start_line"), int) and isinstance(found.get("end_line"), int):
+                        s, e = int(found["start_line"]), int(found["end_line"])
+                        extracted.append((s, e, slice_lines(lines, s, e, total)))
+                    else:
+                        for s, e in grep_ranges_for(abs_path, [name], 25, 3):
+                            extracted.append((s, e, slice_lines(lines, s, e, total)))
+
+            elif read_type == "grep_context":
+                keywords = selectors.get("keywords", [])
+                if not isinstance(keywords, list):
+                    keywords = []
+                keywords = [str(k) for k in keywords if str(k).strip()]
+                context = int(selectors.get("context_lines", 30))
+                for s, e in grep_ranges_for(abs_path, keywords, context, 15):
+                    extracted.append((s, e, slice_lines(lines, s, e, total)))
+
+            for s, e, chunk in extracted:
+                if total_chars >= max_total_chars:
+                    break
+                chunk = chunk.strip("\n")
+                if not chunk:
+                    continue
+                if len(chunk) > args.max_chunk_chars:
+                    chunk = chunk[:args.max_chunk_chars] + "\n...[truncated]..."
+                total_chars += len(chunk)
+                yield build_item(
+                    eid=next_id(),
+                    path=path,
+                    start=s,
+                    end=e,
+                    excerpt=chunk,
+                    tags=tags,
+                    why=reason,
+                    extra={"read_type": read_type, "selectors": selectors},
+                )
+
+    # Overlap file reads with extraction: selected files are read on a small
+    # pool in priority order, at most READ_WORKERS ahead of the loop consuming
+    # them. Nothing new is submitted once max_total_chars is hit, and reads
+    # still pending then are cancelled.
+    unsubmitted.extend(dict.fromkeys(os.path.join(repo, sel["path"]) for sel in selections))
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_WORKERS, len(unsubmitted)))) as ex:
+        def submit_reads() -> None:
+            while unsubmitted and len(pending_reads) < READ_WORKERS and total_chars < max_total_chars:
+                abs_path = unsubmitted.popleft()
+                pending_reads[abs_path] = ex.submit(read_lines, abs_path)
+
+        submit_reads()
+        try:
+            n_items = write_json_array(args.out, iter_evidence())
+        finally:
+            for fut in pending_reads.values():
+                fut.cancel()
+    print(f"[ok] evidence items: {n_items}")
     print(f"[ok] total_chars: {total_chars}")
     print(f"[ok] out: {args.out}")
     return 0
@@ -2,36 +2,76 @@
 from __future__ import annotations
 
 import argparse
+import heapq
 import json
+import math
+import re
 import time
+from operator import itemgetter
 from typing import Any, Dict, List, Tuple
 
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
 FORBIDDEN_SOURCE_MARKERS = ("manual", "fallback", "synthetic", "mock", "test")
+FORBIDDEN_SOURCE_RE = re.compile("|".join(map(re.escape, FORBIDDEN_SOURCE_MARKERS)))
+
+
+def read_json_file(path: str) -> Any:
+    if orjson is not None:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data.startswith(b"\xef\xbb\xbf"):
+            data = data[3:]
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN, bad UTF-8, syntax errors: let json accept or report them as before
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def has_nonfinite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_nonfinite(v) for v in obj)
+    return False
+
+
+def write_json_file(path: str, obj: Any) -> None:
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except (TypeError, orjson.JSONEncodeError):
+            data = None
+        # orjson writes NaN/Infinity as null where json writes them literally.
+        if data is not None and b"null" in data and has_nonfinite(obj):
+            data = None
+        if data is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
 
 
 def normalize_patent_number(pn: Any) -> str:
     return str(pn or "").strip().upper()
 
 
-def claimability_score(item: Dict[str, Any]) -> Tuple[int, int, int]:
-    pn = normalize_patent_number(item.get("patent_number", ""))
-    url = str(item.get("url", "") or "").strip().lower()
-    source = str(item.get("source", "") or "").strip().lower()
+def claimability_score(pn: str, url: str, source: str) -> Tuple[int, int, int]:
+    # pn normalized; url and source already stripped and lowercased.
     has_pn = 1 if pn else 0
     has_google_patent_url = 1 if "patents.google.com/patent/" in url else 0
     is_google_source = 1 if source == "google patents" else 0
     return (has_pn, has_google_patent_url, is_google_source)
 
 
-def detect_bad_sources(items: List[Dict[str, Any]]) -> List[str]:
-    errors: List[str] = []
-    for i, it in enumerate(items, start=1):
-        src = str(it.get("source", "")).strip().lower()
-        if any(mark in src for mark in FORBIDDEN_SOURCE_MARKERS):
-            errors.append(f"item[{i}] source looks synthetic: {it.get('source')}")
-    return errors
-
-
 def main() -> int:
     p = argparse.ArgumentParser(description="Create manual claims extraction template from prior_art.json")
     p.add_argument("--in", dest="input_path", required=True, help="prior_art.json")
@@ -46,12 +86,14 @@ def main() -> int:
     )
     args = p.parse_args()
 
-    with open(args.input_path, "r", encoding="utf-8-sig") as f:
-        prior = json.load(f)
+    prior = read_json_file(args.input_path)
     if not isinstance(prior, list):
         raise SystemExit("prior_art.json must be a JSON list")
 
-    dedup: List[Dict[str, Any]] = []
+    # One pass: dedup, source-integrity check and scoring share the normalized
+    # fields. Error numbering still counts deduplicated items, as before.
+    candidates: List[Tuple[Tuple[int, int, int], str, Dict[str, Any]]] = []
+    errors: List[str] = []
     seen = set()
     for it in prior:
         if not isinstance(it, dict):
@@ -62,22 +104,23 @@ def main() -> int:
         if not key or key in seen:
             continue
         seen.add(key)
-        dedup.append(it)
+        source = str(it.get("source", "") or "").strip().lower()
+        if args.strict_source_integrity and FORBIDDEN_SOURCE_RE.search(source):
+            errors.append(f"item[{len(candidates) + 1}] source looks synthetic: {it.get('source')}")
+        candidates.append((claimability_score(pn, url.lower(), source), pn, it))
 
-    if args.strict_source_integrity:
-        errors = detect_bad_sources(dedup)
-        if errors:
-            raise SystemExit("strict source integrity failed:\n- " + "\n- ".join(errors[:20]))
+    if errors:
+        raise SystemExit("strict source integrity failed:\n- " + "\n- ".join(errors[:20]))
 
-    dedup.sort(key=claimability_score, reverse=True)
-    selected = dedup[: max(1, args.topk)]
+    # nlargest is stable like sort(reverse=True): ties keep their input order.
+    selected = heapq.nlargest(max(1, args.topk), candidates, key=itemgetter(0))
 
     items: List[Dict[str, Any]] = []
-    for idx, it in enumerate(selected, start=1):
+    for idx, (_, pn, it) in enumerate(selected, start=1):
         items.append(
             {
                 "rank": idx,
-                "patent_number": normalize_patent_number(it.get("patent_number", "")),
+                "patent_number": pn,
                 "title": str(it.get("title", "") or "").strip(),
                 "url": str(it.get("url", "") or "").strip(),
                 "source": str(it.get("source", "") or "").strip(),
@@ -98,8 +141,7 @@ def main() -> int:
         "items": items,
     }
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(out_obj, f, ensure_ascii=False, indent=2)
+    write_json_file(args.out, out_obj)
     print(f"[ok] template items: {len(items)}")
     print(f"[ok] out: {args.out}")
 
@@ -18,11 +18,25 @@ from __future__ import annotations
 
 import argparse
 import json
+import math
 import re
-from typing import Any, Dict, List, Tuple
+from itertools import combinations, islice
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
-GENERIC = set(["方法","系统","装置","模块","步骤","数据","信息","处理","实现","用于","包括","其中","一种","技术","特征",
-               "method","system","device","module","step","data","information","process","processing","implement","including","wherein","a","an","the"])
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+GENERIC = frozenset(["方法","系统","装置","模块","步骤","数据","信息","处理","实现","用于","包括","其中","一种","技术","特征",
+                     "method","system","device","module","step","data","information","process","processing","implement","including","wherein","a","an","the"])
+
+TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{1,30}|[\u4e00-\u9fff]{2,8}")
+
+MULTI_SPACE_RE = re.compile(r"\s{2,}")
+
+# The only prior_art_full fields the matrix reads; everything else is dropped on load.
+DOC_FIELDS = ("source", "patent_number", "title", "url", "abstract", "claims_text", "claims_status")
 
 # Minimal bilingual synonym expansion to reduce CN/EN mismatch (best-effort)
 SYN = {
@@ -47,28 +61,30 @@ SYN = {
 }
 
 def tokenize(text: str) -> List[str]:
-    tokens = re.findall(r"[A-Za-z][A-Za-z0-9_-]{1,30}|[\u4e00-\u9fff]{2,8}", text)
+    tokens = TOKEN_RE.findall(text)
+    # order-preserving dedup
     out: List[str] = []
+    seen = set()
     for t in tokens:
         tl = t.lower()
-        if tl in GENERIC or t in GENERIC:
+        # GENERIC holds only lowercase/CJK words, so t in GENERIC implies t == tl.
+        if tl in GENERIC:
             continue
         if len(t) < 2:
             continue
-        out.append(tl)
+        if tl not in seen:
+            seen.add(tl)
+            out.append(tl)
         # synonym expansion
-        for s in SYN.get(tl, []):
-            out.append(str(s).lower())
-    # dedup preserve
-    seen = set()
-    dedup: List[str] = []
-    for t in out:
-        if t not in seen:
-            seen.add(t)
-            dedup.append(t)
-    return dedup
-
-def score_tokens_in_text(tokens: List[str], text: str) -> float:
+        for s in SYN.get(tl, ()):
+            sl = str(s).lower()
+            if sl not in seen:
+                seen.add(sl)
+                out.append(sl)
+    return out
+
+def score_tokens_in_text(tokens: List[str], text: Union[str, Set[str]]) -> float:
+    # `text` may also be the set of tokens already known to occur in the text.
     if not tokens:
         return 0.0
     hits = sum(1 for t in tokens if t in text)
@@ -79,40 +95,83 @@ def label(score: float) -> str:
     if score >= 0.25: return "PARTIAL"
     return "NO"
 
-def extract_snippets(text: str, tokens: List[str], max_snips: int = 3, window: int = 90) -> List[str]:
+def extract_snippets(text: str, tokens: List[str], max_snips: int = 3, window: int = 90, lower: Optional[str] = None) -> List[str]:
     """
     Extract short snippets around token matches (best-effort).
+    `lower` may pass in text.lower() when the caller already has it.
     """
     snippets: List[str] = []
-    lower = text.lower()
+    if lower is None:
+        lower = text.lower()
     for tok in tokens:
-        if tok not in lower:
-            continue
-        # find occurrences
-        for m in re.finditer(re.escape(tok), lower):
-            s = max(0, m.start() - window)
-            e = min(len(text), m.end() + window)
+        # non-overlapping occurrences, same as re.finditer(re.escape(tok), lower)
+        start = lower.find(tok) if tok else -1
+        while start != -1:
+            end = start + len(tok)
+            s = max(0, start - window)
+            e = min(len(text), end + window)
             snip = text[s:e].replace("\n", " ").strip()
-            snip = re.sub(r"\s{2,}", " ", snip)
+            snip = MULTI_SPACE_RE.sub(" ", snip)
             if snip and snip not in snippets:
                 snippets.append(snip)
             if len(snippets) >= max_snips:
                 return snippets
+            start = lower.find(tok, end)
     return snippets
 
-def load_profile(path: str) -> Dict[str, Any]:
+def read_json_file(path: str) -> Any:
+    if orjson is not None:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data.startswith(b"\xef\xbb\xbf"):
+            data = data[3:]
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN, bad UTF-8, syntax errors: let json accept or report them as before
     with open(path, "r", encoding="utf-8-sig") as f:
-        obj = json.load(f)
+        return json.load(f)
+
+def has_nonfinite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(has_nonfinite(v) for v in obj)
+    return False
+
+def write_json_file(path: str, obj: Any) -> None:
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except (TypeError, orjson.JSONEncodeError):
+            data = None
+        # orjson writes NaN/Infinity as null where json writes them literally.
+        if data is not None and b"null" in data and has_nonfinite(obj):
+            data = None
+        if data is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+
+def load_profile(path: str) -> Dict[str, Any]:
+    obj = read_json_file(path)
     if not isinstance(obj, dict):
         raise SystemExit("profile must be JSON object")
     return obj
 
-def load_prior_art_full(path: str) -> List[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8-sig") as f:
-        obj = json.load(f)
+def load_prior_art_full(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    obj = read_json_file(path)
     if not isinstance(obj, list):
         raise SystemExit("prior_art_full must be JSON list")
-    return [d for d in obj if isinstance(d, dict)]
+    # Project to DOC_FIELDS (absent keys stay absent) so the split `claims` list,
+    # claims_fetch_attempts logs etc. of each doc are freed once `obj` goes.
+    # Only the first `limit` docs are projected; the rest are never copied.
+    docs = (d for d in obj if isinstance(d, dict))
+    return [{k: d[k] for k in DOC_FIELDS if k in d} for d in islice(docs, limit)]
 
 def main() -> int:
     p = argparse.ArgumentParser(description="Build novelty matrix (claims-first)")
@@ -151,12 +210,15 @@ def main() -> int:
         feature_texts.append(txt)
         feature_tokens.append(tokenize(txt))
 
-    docs_raw = load_prior_art_full(args.prior_art_full)[: max(1, args.max_docs)]
+    docs_raw = load_prior_art_full(args.prior_art_full, max(1, args.max_docs))
     claims_status_counts: Dict[str, int] = {}
+    claims_ok = 0
     for d in docs_raw:
-        status = str(d.get("claims_status", "") or "unknown")
+        raw_status = d.get("claims_status", "")
+        status = str(raw_status or "unknown")
         claims_status_counts[status] = claims_status_counts.get(status, 0) + 1
-    claims_ok = sum(1 for d in docs_raw if str(d.get("claims_status", "")).lower() in {"ok", "ok_fallback", "manual_ok"})
+        if str(raw_status).lower() in {"ok", "ok_fallback", "manual_ok"}:
+            claims_ok += 1
     claims_total = len(docs_raw)
     claims_ok_ratio = (claims_ok / claims_total) if claims_total else 0.0
     quality_gate = {
@@ -193,11 +255,15 @@ def main() -> int:
     # per doc overall match score (sum of best scores)
     doc_overall: List[Tuple[int, float]] = []
 
-    # For pair co-occurrence: count docs where both not NO
+    # For pair co-occurrence: count docs where both not NO. The union count
+    # (either not NO) follows from the per-feature counts at the end.
     n_feat = len(feature_texts)
-    pair_union = [[0]*n_feat for _ in range(n_feat)]
     pair_co = [[0]*n_feat for _ in range(n_feat)]
 
+    # Features share many tokens (synonyms, common terms): probe each distinct
+    # token once per doc, then score features by set membership.
+    all_tokens = list(dict.fromkeys(t for toks in feature_tokens for t in toks))
+
     for di, d in enumerate(docs_raw):
         claims_text = str(d.get("claims_text","") or "")
         abstract = str(d.get("abstract","") or "")
@@ -207,10 +273,12 @@ def main() -> int:
         row: List[Dict[str, Any]] = []
         doc_score_sum = 0.0
         labels_for_pairs: List[str] = []
+        claims_hits = {t for t in all_tokens if t in claims_lower} if claims_lower else set()
+        abs_hits = {t for t in all_tokens if t in abs_lower} if abs_lower else set()
 
         for fi, (fid, ftxt, toks) in enumerate(zip(feature_ids, feature_texts, feature_tokens)):
-            score_claims = score_tokens_in_text(toks, claims_lower) if claims_lower else 0.0
-            score_abs = score_tokens_in_text(toks, abs_lower) if abs_lower else 0.0
+            score_claims = score_tokens_in_text(toks, claims_hits) if claims_lower else 0.0
+            score_abs = score_tokens_in_text(toks, abs_hits) if abs_lower else 0.0
 
             # claims-first: use max, but keep both
             best = max(score_claims, score_abs)
@@ -220,8 +288,13 @@ def main() -> int:
 
             doc_score_sum += best
 
-            # snippets: prefer claims
-            snippets = extract_snippets(claims_text if claims_text else abstract, toks, max_snips=3, window=90)
+            # snippets: prefer claims; only tokens known to occur can anchor one
+            if claims_text:
+                snip_toks = [t for t in toks if t in claims_hits]
+                snippets = extract_snippets(claims_text, snip_toks, max_snips=3, window=90, lower=claims_lower) if snip_toks else []
+            else:
+                snip_toks = [t for t in toks if t in abs_hits]
+                snippets = extract_snippets(abstract, snip_toks, max_snips=3, window=90, lower=abs_lower) if snip_toks else []
 
             row.append({
                 "feature_id": fid,
@@ -234,16 +307,10 @@ def main() -> int:
                 "evidence_snippets": snippets,
             })
 
-        # pair stats for this doc
-        for i in range(n_feat):
-            for j in range(i+1, n_feat):
-                li, lj = labels_for_pairs[i], labels_for_pairs[j]
-                in_union = (li != "NO") or (lj != "NO")
-                in_co = (li != "NO") and (lj != "NO")
-                if in_union:
-                    pair_union[i][j] += 1
-                if in_co:
-                    pair_co[i][j] += 1
+        # pair stats for this doc: only pairs of matched features change
+        matched = [i for i, lab in enumerate(labels_for_pairs) if lab != "NO"]
+        for i, j in combinations(matched, 2):
+            pair_co[i][j] += 1
 
         matrix.append(row)
         doc_overall.append((di, doc_score_sum))
@@ -268,10 +335,11 @@ def main() -> int:
 
     # pair candidates: high union but low co-occurrence
     pair_candidates = []
+    matched_docs = [c["PARTIAL"] + c["YES"] for c in counts]
     for i in range(n_feat):
         for j in range(i+1, n_feat):
-            union = pair_union[i][j]
             co = pair_co[i][j]
+            union = matched_docs[i] + matched_docs[j] - co
             union_ratio = union / n_docs
             co_ratio = co / n_docs
             # interesting if union is non-trivial but co is small
@@ -305,8 +373,7 @@ def main() -> int:
         "note": "Heuristic claims-first matrix for preliminary comparison; not a legal novelty conclusion.",
     }
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    write_json_file(args.out, out)
 
     print(f"[ok] features: {len(feature_texts)}, documents: {len(documents)}")
     print(
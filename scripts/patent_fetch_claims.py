@@ -24,11 +24,48 @@ from html import unescape
 from typing import Any, Dict, List, Optional, Tuple
 
 UA = "Mozilla/5.0 (compatible; PatentAssistant/5.0; +https://example.invalid)"
-RETRYABLE_HTTP_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
-SUPPORTED_CLAIM_SOURCES = {"google", "espacenet", "cnipa", "lens", "fpo"}
-ALLOWED_PRIOR_ART_SOURCES = {"Google Patents", "Lens.org", "Espacenet", "CNIPA"}
+RETRYABLE_HTTP_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+SUPPORTED_CLAIM_SOURCES = frozenset({"google", "espacenet", "cnipa", "lens", "fpo"})
+ALLOWED_PRIOR_ART_SOURCES = frozenset({"Google Patents", "Lens.org", "Espacenet", "CNIPA"})
 FORBIDDEN_SOURCE_MARKERS = ("manual", "fallback", "synthetic", "mock", "test")
-ALLOWED_MANUAL_SOURCE_TYPES = {"google_patents", "office_portal", "pdf_copy", "freepatentsonline"}
+FORBIDDEN_SOURCE_RE = re.compile("|".join(map(re.escape, FORBIDDEN_SOURCE_MARKERS)))
+ALLOWED_MANUAL_SOURCE_TYPES = frozenset({"google_patents", "office_portal", "pdf_copy", "freepatentsonline"})
+
+# Claim source fallback order for --claim-sources auto, keyed by publication country.
+_EPO_FIRST = ("espacenet", "google", "lens", "cnipa", "fpo")
+_FPO_FIRST = ("fpo", "google", "espacenet", "lens", "cnipa")
+CLAIM_SOURCE_ORDER_BY_COUNTRY = {
+    "CN": ("cnipa", "google", "espacenet", "lens", "fpo"),
+    "EP": _EPO_FIRST, "WO": _EPO_FIRST,
+    "US": _FPO_FIRST, "JP": _FPO_FIRST, "KR": _FPO_FIRST,
+    "DE": _FPO_FIRST, "FR": _FPO_FIRST, "GB": _FPO_FIRST,
+}
+DEFAULT_CLAIM_SOURCE_ORDER = ("google", "espacenet", "cnipa", "lens", "fpo")
+
+# Tags that share a replacement are matched by one alternation, so the page
+# is rewritten in three passes instead of seven.
+LINE_BREAK_TAG_RE = re.compile(r"(?i)<br\s*/?>|</(?:p|div|li)\s*>")
+LI_OPEN_RE = re.compile(r"(?i)<li\b[^>]*>")
+SCRIPT_STYLE_RE = re.compile(r"(?is)<(script|style).*?>.*?</\1>")
+TAG_RE = re.compile(r"(?s)<[^>]+>")
+HSPACE_RE = re.compile(r"[ \t\r\f\v]+")
+BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n+")
+# A claim number: 1-3 digits and a dot at the start or after whitespace.
+CLAIM_HEADER_RE = re.compile(r"(?:^|\s)\s*(\d{1,3})\.\s*")
+WHAT_IS_CLAIMED_RE = re.compile(r"(?is)^\s*what\s+is\s+claimed\s+is\s*:?\s*")
+COUNTRY_CODE_RE = re.compile(r"^([A-Z]{2})")
+US_PN_RE = re.compile(r"^US(\d+)([A-Z]\d?)?$")
+# (marker, pattern): the lowercase marker must occur in any page the pattern can match.
+CLAIMS_SECTION_PATTERNS = (
+    (
+        "disp_elm_title",
+        re.compile(r'(?is)<div[^>]*class="disp_elm_title"[^>]*>\s*Claims:\s*</div>\s*<div[^>]*class="disp_elm_text"[^>]*>(.*?)</div>'),
+    ),
+    ('itemprop="claims"', re.compile(r'(?is)<section[^>]*itemprop="claims"[^>]*>(.*?)</section>')),
+    ('id="claims"', re.compile(r'(?is)<section[^>]*id="claims"[^>]*>(.*?)</section>')),
+    ("claims", re.compile(r'(?is)<section[^>]*class="[^"]*claims[^"]*"[^>]*>(.*?)</section>')),
+)
+CLAIMS_FALLBACK_KEYWORDS = ("\nclaims", "\nclaim", "what is claimed is")
 
 
 def sleep_with_jitter(base_seconds: float, jitter: float) -> None:
@@ -90,47 +127,38 @@ def cache_path(cache_dir: str, key: str) -> str:
 
 
 def strip_tags_keep_newlines(html: str) -> str:
-    html = re.sub(r"(?i)<br\s*/?>", "\n", html)
-    html = re.sub(r"(?i)</p\s*>", "\n", html)
-    html = re.sub(r"(?i)</div\s*>", "\n", html)
-    html = re.sub(r"(?i)</li\s*>", "\n", html)
-    html = re.sub(r"(?i)<li\b[^>]*>", "- ", html)
-    html = re.sub(r"(?is)<script.*?>.*?</script>", " ", html)
-    html = re.sub(r"(?is)<style.*?>.*?</style>", " ", html)
-    text = re.sub(r"(?s)<[^>]+>", " ", html)
+    html = LINE_BREAK_TAG_RE.sub("\n", html)
+    html = LI_OPEN_RE.sub("- ", html)
+    html = SCRIPT_STYLE_RE.sub(" ", html)
+    text = TAG_RE.sub(" ", html)
     text = unescape(text)
-    text = re.sub(r"[ \t\r\f\v]+", " ", text)
-    text = re.sub(r"\n\s*\n\s*\n+", "\n\n", text)
+    text = HSPACE_RE.sub(" ", text)
+    text = BLANK_LINES_RE.sub("\n\n", text)
     return text.strip()
 
 
-def extract_claims_section(html: str) -> Optional[str]:
-    for pat in [
-        r'(?is)<div[^>]*class="disp_elm_title"[^>]*>\s*Claims:\s*</div>\s*<div[^>]*class="disp_elm_text"[^>]*>(.*?)</div>',
-        r'(?is)<section[^>]*itemprop="claims"[^>]*>(.*?)</section>',
-        r'(?is)<section[^>]*id="claims"[^>]*>(.*?)</section>',
-        r'(?is)<section[^>]*class="[^"]*claims[^"]*"[^>]*>(.*?)</section>',
-    ]:
-        m = re.search(pat, html)
+def extract_claims_section(html: str, lower: Optional[str] = None) -> Optional[str]:
+    for marker, pat in CLAIMS_SECTION_PATTERNS:
+        if lower is not None and marker not in lower:
+            continue
+        m = pat.search(html)
         if m:
             return m.group(1)
     return None
 
 
 def split_claims(text: str, max_claims: int = 60) -> List[Dict[str, Any]]:
-    t = re.sub(r"(\s)(\d{1,3})\.", r"\n\2.", text)
-    parts = re.split(r"(?:^|\n)\s*(\d{1,3})\.\s*", t)
-    if len(parts) <= 1:
+    # Slice bodies between header matches; no rewritten copy of the text.
+    headers = list(CLAIM_HEADER_RE.finditer(text))
+    if not headers:
         return [{"num": None, "text": text.strip()}] if text.strip() else []
 
     claims: List[Dict[str, Any]] = []
-    i = 1
-    while i + 1 < len(parts):
-        num = parts[i].strip()
-        body = parts[i + 1].strip()
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        body = text[m.end():end].strip()
         if body:
-            claims.append({"num": num, "text": body})
-        i += 2
+            claims.append({"num": m.group(1), "text": body})
         if len(claims) >= max_claims:
             break
     return claims
@@ -141,7 +169,7 @@ def normalize_patent_number(pn: Any) -> str:
 
 
 def patent_country_code(pn: str) -> str:
-    m = re.match(r"^([A-Z]{2})", normalize_patent_number(pn))
+    m = COUNTRY_CODE_RE.match(normalize_patent_number(pn))
     return m.group(1) if m else ""
 
 
@@ -153,14 +181,8 @@ def choose_claim_sources(item: Dict[str, Any], claim_sources_arg: str) -> List[s
         return selected or ["google"]
 
     pn = normalize_patent_number(item.get("patent_number", ""))
-    cc = patent_country_code(pn)
-    if cc == "CN":
-        return ["cnipa", "google", "espacenet", "lens", "fpo"]
-    if cc in {"EP", "WO"}:
-        return ["espacenet", "google", "lens", "cnipa", "fpo"]
-    if cc in {"US", "JP", "KR", "DE", "FR", "GB"}:
-        return ["fpo", "google", "espacenet", "lens", "cnipa"]
-    return ["google", "espacenet", "cnipa", "lens", "fpo"]
+    order = CLAIM_SOURCE_ORDER_BY_COUNTRY.get(patent_country_code(pn), DEFAULT_CLAIM_SOURCE_ORDER)
+    return list(order)
 
 
 def classify_fetch_error(err: Exception) -> Tuple[str, str]:
@@ -231,7 +253,7 @@ def build_fpo_url_candidates(item: Dict[str, Any]) -> List[str]:
     pn = normalize_patent_number(item.get("patent_number", ""))
     if not pn.startswith("US"):
         return []
-    m = re.match(r"^US(\d+)([A-Z]\d?)?$", pn)
+    m = US_PN_RE.match(pn)
     if not m:
         return []
 
@@ -264,41 +286,40 @@ def build_source_url_candidates(item: Dict[str, Any], source: str) -> List[str]:
     return []
 
 
-def extract_claims_fallback_from_text(text: str) -> str:
-    if not text:
-        return ""
-    lower = text.lower()
-    keywords = ["\nclaims", "\nclaim", "权利要求书", "权利要求"]
-    starts = [lower.find(k.lower()) for k in keywords if lower.find(k.lower()) >= 0]
-    if not starts:
-        return ""
-    s = min(starts)
-    e = min(len(text), s + 40000)
-    return text[s:e].strip()
+def find_first_keyword(lower: str, keywords: Tuple[str, ...]) -> int:
+    # Each later find only needs to scan up to the best start seen so far.
+    best = -1
+    for k in keywords:
+        i = lower.find(k, 0, len(lower) if best < 0 else best + len(k))
+        if i >= 0:
+            best = i
+    return best
 
 
-def extract_claims_fallback_from_text_v2(text: str) -> str:
+def extract_claims_fallback_from_text(text: str, keywords: Tuple[str, ...] = CLAIMS_FALLBACK_KEYWORDS) -> str:
     if not text:
         return ""
-    lower = text.lower()
-    keywords = ["\nclaims", "\nclaim", "what is claimed is"]
-    starts = [lower.find(k.lower()) for k in keywords if lower.find(k.lower()) >= 0]
-    if not starts:
+    s = find_first_keyword(text.lower(), keywords)
+    if s < 0:
         return ""
-    s = min(starts)
     e = min(len(text), s + 40000)
     return text[s:e].strip()
 
 
 def parse_claims_from_html(html: str) -> Tuple[str, List[Dict[str, Any]], str]:
-    sec = extract_claims_section(html)
+    lower = html.lower()
+    # Every section pattern and fallback keyword contains "claim"; skip the
+    # regex and tag-stripping passes on pages that cannot match.
+    if "claim" not in lower:
+        return "", [], "claims_section_not_found"
+    sec = extract_claims_section(html, lower)
     if sec:
         text = strip_tags_keep_newlines(sec)
-        text = re.sub(r"(?is)^\s*what\s+is\s+claimed\s+is\s*:?\s*", "", text).strip()
+        text = WHAT_IS_CLAIMED_RE.sub("", text).strip()
         claims = split_claims(text)
         return text[:200000], claims, "ok" if text else "empty"
     flat_text = strip_tags_keep_newlines(html)
-    fallback = extract_claims_fallback_from_text_v2(flat_text)
+    fallback = extract_claims_fallback_from_text(flat_text)
     if fallback:
         claims = split_claims(fallback)
         return fallback[:200000], claims, "ok_fallback"
@@ -320,7 +341,7 @@ def validate_prior_art_items(items: List[Dict[str, Any]]) -> List[str]:
             continue
         source = str(it.get("source", "")).strip()
         source_l = source.lower()
-        if any(mark in source_l for mark in FORBIDDEN_SOURCE_MARKERS):
+        if FORBIDDEN_SOURCE_RE.search(source_l):
             errors.append(f"item[{i}] source looks synthetic: {source}")
         if source and source not in ALLOWED_PRIOR_ART_SOURCES:
             errors.append(f"item[{i}] source is not allowed: {source}")
@@ -376,7 +397,7 @@ def merge_manual_claims(
         extraction_note = str(manual.get("extraction_note", "") or "").strip()
 
         if strict_manual_evidence:
-            if not (source_url.startswith("http://") or source_url.startswith("https://")):
+            if not source_url.startswith(("http://", "https://")):
                 errors.append(f"manual claims {pn} missing valid claims_source_url")
                 continue
             if source_type not in ALLOWED_MANUAL_SOURCE_TYPES:
@@ -710,11 +731,14 @@ def main() -> int:
         json.dump(out_items, f, ensure_ascii=False, indent=2)
 
     status_counts: Dict[str, int] = {}
+    ok = 0
     for x in out_items:
-        s = str(x.get("claims_status", "unknown"))
+        raw_status = x.get("claims_status", "unknown")
+        s = str(raw_status)
         status_counts[s] = status_counts.get(s, 0) + 1
+        if raw_status in {"ok", "ok_fallback", "manual_ok"}:
+            ok += 1
 
-    ok = sum(1 for x in out_items if x.get("claims_status") in {"ok", "ok_fallback", "manual_ok"})
     total = len(out_items)
     ok_ratio = (ok / total) if total else 0.0
     print(f"[ok] fetched claims: {ok}/{total} (ratio={ok_ratio:.3f})")
@@ -24,14 +24,15 @@ import urllib.request
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
-RETRYABLE_HTTP_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_HTTP_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
 PATENT_URL_RE = re.compile(r"/patent/([A-Za-z0-9]+)", re.IGNORECASE)
 TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{1,30}|[\u4e00-\u9fff]{2,8}")
 PUB_NO_RE = re.compile(r"\b(?:CN|US|EP|WO|JP|KR|DE|FR|GB)\d{6,14}[A-Z0-9]{0,4}\b", re.IGNORECASE)
 
-ALLOWED_RESULT_SOURCES = {"Google Patents", "Lens.org", "Espacenet", "CNIPA"}
+ALLOWED_RESULT_SOURCES = frozenset({"Google Patents", "Lens.org", "Espacenet", "CNIPA"})
 FORBIDDEN_SOURCE_MARKERS = ("manual", "fallback", "synthetic", "mock", "test")
-MOJIBAKE_MARKERS = set("锛銆鍙鏃鏈鍥鍚鎴闂涓崭笓鍒妫索")
+FORBIDDEN_SOURCE_RE = re.compile("|".join(map(re.escape, FORBIDDEN_SOURCE_MARKERS)))
+MOJIBAKE_MARKERS = frozenset("锛銆鍙鏃鏈鍥鍚鎴闂涓崭笓鍒妫索")
 
 
 def _sleep_with_jitter(base_seconds: float, jitter: float) -> None:
@@ -149,7 +150,7 @@ def validate_result_items(items: List[Dict[str, Any]]) -> List[str]:
             continue
         source = str(it.get("source", "")).strip()
         source_l = source.lower()
-        if any(mark in source_l for mark in FORBIDDEN_SOURCE_MARKERS):
+        if FORBIDDEN_SOURCE_RE.search(source_l):
             errors.append(f"item[{i}] has forbidden source marker: {source}")
         if source and source not in ALLOWED_RESULT_SOURCES:
             errors.append(f"item[{i}] has unknown source: {source}")
@@ -191,7 +192,7 @@ def _extract_publication_numbers(html_text: str, country: str, max_items: int) -
     for m in PUB_NO_RE.finditer(html_text):
         pn = m.group(0).upper()
         if country_u and len(country_u) == 2:
-            if not (pn.startswith(country_u) or pn.startswith("WO") or pn.startswith("EP")):
+            if not pn.startswith((country_u, "WO", "EP")):
                 continue
         if pn in seen:
             continue
@@ -436,7 +437,7 @@ def search_cnipa(
 
 
 def analyze_similarity(query: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    kws = [k for k in re.split(r"\s+", query.lower().strip()) if k]
+    kws = query.lower().split()
     kw_set = set(kws)
     for it in items:
         if "note" in it:
@@ -16,9 +16,12 @@ import sys
 from typing import Any, Dict, List, Optional, Tuple
 
 TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{1,30}|[\u4e00-\u9fff]{2,10}")
-MOJIBAKE_MARKERS = set("閿涢妴閸欓弮閺堥崶閸氶幋闂傛稉宕瑩閸掑Λ绱")
+MOJIBAKE_MARKERS = frozenset("閿涢妴閸欓弮閺堥崶閸氶幋闂傛稉宕瑩閸掑Λ绱")
 FORBIDDEN_SOURCE_MARKERS = ("manual", "fallback", "synthetic", "mock", "test")
-ALLOWED_RESULT_SOURCES = {"Google Patents", "Lens.org", "Espacenet", "CNIPA"}
+FORBIDDEN_SOURCE_RE = re.compile("|".join(map(re.escape, FORBIDDEN_SOURCE_MARKERS)))
+ALLOWED_RESULT_SOURCES = frozenset({"Google Patents", "Lens.org", "Espacenet", "CNIPA"})
+# Below this many phrases, per-phrase substring probes beat an automaton pass.
+PHRASE_AUTOMATON_MIN = 64
 
 
 def normalize_text(s: Any) -> str:
@@ -98,7 +101,7 @@ def validate_prior_art_items(items: List[Dict[str, Any]]) -> List[str]:
             continue
         source = normalize_text(it.get("source"))
         source_l = source.lower()
-        if any(mark in source_l for mark in FORBIDDEN_SOURCE_MARKERS):
+        if FORBIDDEN_SOURCE_RE.search(source_l):
             errors.append(f"item[{i}] has forbidden source marker: {source}")
         if source and source not in ALLOWED_RESULT_SOURCES:
             errors.append(f"item[{i}] has unknown source: {source}")
@@ -138,10 +141,27 @@ def profile_keywords(profile: Dict[str, Any]) -> Tuple[List[str], List[str]]:
     return phrases, tokens
 
 
+def build_phrase_matcher(phrases: List[str]) -> Any:
+    """Aho-Corasick automaton over phrases, or None when unavailable or not worth it."""
+    if len(phrases) < PHRASE_AUTOMATON_MIN:
+        return None
+    try:
+        import ahocorasick  # type: ignore
+    except ImportError:
+        return None
+    automaton = ahocorasick.Automaton()
+    for p in phrases:
+        if p:
+            automaton.add_word(p, p)
+    automaton.make_automaton()
+    return automaton
+
+
 def score_item(
     item: Dict[str, Any],
     phrases: List[str],
     profile_tokens: List[str],
+    matcher: Any = None,
 ) -> Tuple[float, Dict[str, Any]]:
     title = normalize_text(item.get("title"))
     abstract = normalize_text(item.get("abstract"))
@@ -152,11 +172,23 @@ def score_item(
 
     phrase_hits = 0
     title_phrase_hits = 0
-    for p in phrases:
-        if p and p in combined:
-            phrase_hits += 1
-            if p in title_l:
-                title_phrase_hits += 1
+    if matcher is not None:
+        # combined starts with title_l, so a match ending inside it is a title hit.
+        found = set()
+        in_title = set()
+        title_end = len(title_l)
+        for end, p in matcher.iter(combined):
+            found.add(p)
+            if end < title_end:
+                in_title.add(p)
+        phrase_hits = len(found)
+        title_phrase_hits = len(in_title)
+    else:
+        for p in phrases:
+            if p and p in combined:
+                phrase_hits += 1
+                if p in title_l:
+                    title_phrase_hits += 1
 
     doc_tokens = dedup(tokenize(combined))
     pset = set(profile_tokens)
@@ -266,11 +298,12 @@ def main() -> int:
         agent_map = build_agent_score_map(agent_obj)
 
     w = max(0.0, min(1.0, float(args.agent_weight)))
+    matcher = build_phrase_matcher(phrases)
     out: List[Dict[str, Any]] = []
     for it in prior:
         if not isinstance(it, dict):
             continue
-        heur, parts = score_item(it, phrases, profile_tokens)
+        heur, parts = score_item(it, phrases, profile_tokens, matcher)
         pn = normalize_patent_number(it.get("patent_number"))
         key = pn or normalize_text(it.get("url"))
         agent_score: Optional[float] = None
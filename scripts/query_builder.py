@@ -8,7 +8,8 @@ import re
 from typing import Any, Dict, List, Tuple
 
 TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_-]{1,30}|[\u4e00-\u9fff]{2,8}")
-MOJIBAKE_MARKERS = set("锛銆鍙鏃鏈鍥鍚鎴鍙闂涓鸿澶勭悊")
+MOJIBAKE_MARKERS = frozenset("锛銆鍙鏃鏈鍥鍚鎴鍙闂涓鸿澶勭悊")
+KW_STRIP_RE = re.compile(r"[\[\]（）()\"“”]")
 
 def dedup(seq: List[str]) -> List[str]:
     seen = set()
@@ -22,7 +23,7 @@ def dedup(seq: List[str]) -> List[str]:
     return out
 
 def normalize_kw(k: str) -> str:
-    return re.sub(r"[\[\]（）()\"“”]", "", k).strip()
+    return KW_STRIP_RE.sub("", k).strip()
 
 def is_garbled_text(text: str) -> bool:
     s = str(text).strip()
@@ -262,7 +263,9 @@ def main() -> int:
             final_queries = list(profile_out["queries"])
             query_source = "profile_fallback_no_agent"
 
-    final_queries = dedup([q for q in final_queries if is_query_valid(q, args.min_query_tokens)])[: args.max_queries]
+    # Agent and profile queries are each already stripped, deduped and validated
+    # against min_query_tokens, and every merge above goes through dedup().
+    final_queries = final_queries[: args.max_queries]
     if args.strict and not final_queries:
         raise SystemExit("No valid queries generated after agent/profile merge. Fix inputs then retry.")
 
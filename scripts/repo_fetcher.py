@@ -10,7 +10,7 @@ from scripts.utils.git_utils import git_clone, git_checkout, git_rev_parse_head
 from scripts.utils.io import write_json
 
 def is_git_url(s: str) -> bool:
-    return s.startswith("http://") or s.startswith("https://") or s.startswith("git@") or s.endswith(".git")
+    return s.startswith(("http://", "https://", "git@")) or s.endswith(".git")
 
 def main() -> int:
     p = argparse.ArgumentParser(description="Fetch (clone) a repo and record commit SHA (no code execution).")
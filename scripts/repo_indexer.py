@@ -2,12 +2,14 @@
 from __future__ import annotations
 
 import argparse
+import heapq
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import asdict
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from scripts.utils.io import read_lines, read_text, write_json
+from scripts.utils.io import iter_lines, read_head_lines, read_text, write_json
 from scripts.utils.md_outline import parse_headings
 from scripts.utils.path_filter import PathFilter
 from scripts.utils.symbol_index import index_python_symbols
@@ -19,65 +21,66 @@ LANG_BY_EXT = {
     ".yml": "yaml", ".yaml": "yaml", ".json": "json", ".toml": "toml",
 }
 
-DOC_NAMES = {"readme.md", "readme.zh.md", "readme.en.md"}
+DOC_EXTS = (".md", ".rst", ".txt")
+CONFIG_EXTS = (".yaml", ".yml", ".toml", ".ini", ".cfg", ".json")
 
 SIGNAL_KEYWORDS = [
     "scheduler", "pipeline", "index", "engine", "cache", "dedup", "optimizer", "retry",
     "ranking", "scoring", "token", "vector", "search", "planner", "agent", "workflow",
 ]
 
-def guess_kind(path: str) -> str:
-    lower = path.lower()
-    base = os.path.basename(lower)
-    if base in DOC_NAMES or lower.endswith("readme.md"):
+def guess_kind(lower: str) -> str:
+    # README*.md and docs/ files all end in a DOC_EXTS suffix, so one check covers them.
+    if lower.endswith(DOC_EXTS):
         return "doc"
-    if lower.startswith("docs/") or "/docs/" in lower:
-        if lower.endswith((".md", ".rst", ".txt")):
-            return "doc"
-    if lower.endswith((".md", ".rst", ".txt")):
-        return "doc"
-    if lower.endswith((".yaml", ".yml", ".toml", ".ini", ".cfg", ".json")):
+    if lower.endswith(CONFIG_EXTS):
         return "config"
     return "code"
 
-def guess_language(path: str) -> str:
-    ext = os.path.splitext(path)[1].lower()
-    return LANG_BY_EXT.get(ext, "unknown")
+def guess_language(lower: str) -> str:
+    # Same result as os.path.splitext(lower)[1] without the generic helper.
+    stem, dot, ext = lower.rpartition("/")[2].rpartition(".")
+    if not dot or not stem.strip("."):
+        return "unknown"
+    return LANG_BY_EXT.get("." + ext, "unknown")
+
+GO_READ_WORKERS = 16
+
+def is_go_main(path: str) -> bool:
+    try:
+        lines = read_head_lines(path, 200)
+    except Exception:
+        return False
+    joined = "\\n".join(lines)
+    if "\x00" in joined:
+        return False
+    return "package main" in joined and "func main(" in joined
 
 def find_entrypoints(repo: str, all_files: List[str]) -> List[str]:
     entry = []
+    file_set = set(all_files)
     candidates = ["main.py","app.py","server.py","cli.py","src/main.py","src/app.py","src/server.py"]
     for c in candidates:
-        if c in all_files:
+        if c in file_set:
             entry.append(c)
-    if "package.json" in all_files:
+    if "package.json" in file_set:
         try:
             text = read_text(os.path.join(repo, "package.json"))
             pkg = json.loads(text)
             main_file = pkg.get("main")
-            if isinstance(main_file, str) and main_file in all_files:
+            if isinstance(main_file, str) and main_file in file_set:
                 entry.append(main_file)
         except Exception:
             pass
-    go_files = [p for p in all_files if p.endswith(".go")]
-    for gf in go_files[:200]:
-        try:
-            lines = read_lines(os.path.join(repo, gf))
-            joined = "\\n".join(lines[:200])
-            if "package main" in joined and "func main(" in joined:
-                entry.append(gf)
-        except Exception:
-            continue
-    seen = set()
-    out = []
-    for p in entry:
-        if p not in seen:
-            seen.add(p)
-            out.append(p)
-    return out
-
-def score_file(path: str, kind: str, size: int, is_entry: bool) -> float:
-    lower = path.lower()
+    go_files = [p for p in all_files if p.endswith(".go")][:200]
+    if go_files:
+        # Reads are I/O bound; overlap them across threads, keep input order.
+        with ThreadPoolExecutor(max_workers=min(GO_READ_WORKERS, len(go_files))) as ex:
+            hits = list(ex.map(is_go_main, [os.path.join(repo, gf) for gf in go_files]))
+        entry.extend(gf for gf, hit in zip(go_files, hits) if hit)
+    return list(dict.fromkeys(entry))
+
+def score_file(lower: str, kind: str, size: int, is_entry: bool) -> float:
     score = 0.0
     if kind == "doc":
         score += 4.0
@@ -102,63 +105,77 @@ def score_file(path: str, kind: str, size: int, is_entry: bool) -> float:
         score -= 1.5
     return score
 
+# Below this many parse jobs the process pool costs more than it saves.
+PARALLEL_MIN_JOBS = 200
+
+def parse_file(job: tuple) -> Optional[list]:
+    """
+    Worker: headings for a markdown doc ("doc", path, max_headings),
+    or symbols for a python file ("code", path).
+    """
+    try:
+        if job[0] == "doc":
+            _, abs_path, max_doc_headings = job
+            # Streamed: stops reading once max_doc_headings are found.
+            heads = parse_headings(iter_lines(abs_path), max_headings=max_doc_headings)
+            return [h.text for h in heads]
+        spans = index_python_symbols(read_text(job[1]))
+        return [asdict(s) for s in spans[:200]]
+    except Exception:
+        return None
+
 def main() -> int:
     p = argparse.ArgumentParser(description="Build repo_index.json for guided reading.")
     p.add_argument("--repo", required=True, help="Path to local repo checkout")
     p.add_argument("--out", required=True, help="Output repo_index.json path")
     p.add_argument("--max_files", type=int, default=5000, help="Max files to index")
     p.add_argument("--max_doc_headings", type=int, default=60, help="Max headings per doc to record")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="Worker processes for heading/symbol parsing (1 = in-process; small repos always run in-process)")
     args = p.parse_args()
 
     repo = os.path.abspath(args.repo)
     pf = PathFilter()
 
     files: List[str] = []
-    for root, dirnames, filenames in os.walk(repo):
-        dirnames[:] = pf.iter_filtered_dirs(dirnames)
-        rel_root = os.path.relpath(root, repo)
-        if rel_root == ".":
-            rel_root = ""
-        for fn in filenames:
-            rel = os.path.join(rel_root, fn).replace("\\\\", "/").lstrip("./")
-            files.append(rel)
-            if len(files) >= args.max_files:
-                break
+    # rel -> (absolute path, size); DirEntry already carries both.
+    stats: Dict[str, Tuple[str, int]] = {}
+    for rel, entry in pf.iter_files(repo):
+        files.append(rel)
+        try:
+            stats[rel] = (entry.path, entry.stat().st_size)
+        except OSError:
+            pass
         if len(files) >= args.max_files:
             break
 
     entrypoints = find_entrypoints(repo, files)
+    entry_set = set(entrypoints)
 
     docs = []
     symbol_index: Dict[str, List[dict]] = {}
     file_meta = []
+    jobs: List[tuple] = []
+    job_keys: List[Tuple[str, int]] = []
     for rel in files:
-        abs_path = os.path.join(repo, rel)
-        try:
-            size = os.path.getsize(abs_path)
-        except OSError:
+        stat = stats.get(rel)
+        if stat is None:
             continue
-        kind = guess_kind(rel)
-        lang = guess_language(rel)
-        is_entry = rel in entrypoints
-        score_hint = score_file(rel, kind, size, is_entry)
-
-        if kind == "doc" and rel.lower().endswith(".md") and size <= 300_000:
-            try:
-                lines = read_lines(abs_path)
-                heads = parse_headings(lines, max_headings=args.max_doc_headings)
-                docs.append({"path": rel, "headings": [h.text for h in heads], "size": size})
-            except Exception:
-                pass
-
-        if lang == "python" and kind == "code" and size <= 300_000:
-            try:
-                src = read_text(abs_path)
-                spans = index_python_symbols(src)
-                if spans:
-                    symbol_index[rel] = [asdict(s) for s in spans[:200]]
-            except Exception:
-                pass
+        abs_path, size = stat
+        # Classifiers below all take the lowercased path; compute it once.
+        lower = rel.lower()
+        kind = guess_kind(lower)
+        lang = guess_language(lower)
+        is_entry = rel in entry_set
+        score_hint = score_file(lower, kind, size, is_entry)
+
+        if size <= 300_000:
+            if kind == "doc" and lower.endswith(".md"):
+                jobs.append(("doc", abs_path, args.max_doc_headings))
+                job_keys.append((rel, size))
+            elif lang == "python" and kind == "code":
+                jobs.append(("code", abs_path))
+                job_keys.append((rel, size))
 
         file_meta.append({
             "path": rel,
@@ -169,7 +186,21 @@ def main() -> int:
             "score_hint": round(score_hint, 3),
         })
 
-    top_recommended = [x["path"] for x in sorted(file_meta, key=lambda d: d["score_hint"], reverse=True)[:40]]
+    if args.workers > 1 and len(jobs) >= PARALLEL_MIN_JOBS:
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            results = list(ex.map(parse_file, jobs, chunksize=32))
+    else:
+        results = [parse_file(job) for job in jobs]
+
+    for (rel, size), job, res in zip(job_keys, jobs, results):
+        if res is None:
+            continue
+        if job[0] == "doc":
+            docs.append({"path": rel, "headings": res, "size": size})
+        elif res:
+            symbol_index[rel] = res
+
+    top_recommended = [x["path"] for x in heapq.nlargest(40, file_meta, key=lambda d: d["score_hint"])]
 
     out = {
         "repo": {"path": repo, "commit_sha": "UNKNOWN"},
@@ -178,7 +209,7 @@ def main() -> int:
         "files": file_meta,
         "symbol_index": symbol_index,
         "top_recommended": top_recommended,
-        "ignore_dirs": sorted(list(pf.ignore_dirs)),
+        "ignore_dirs": sorted(pf.ignore_dirs),
     }
 
     maybe_meta = os.path.join(os.path.dirname(args.out), "repo_meta.json")
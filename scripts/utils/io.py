@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import json
-from typing import Any
+import math
+import os
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
 def read_text(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="replace") as f:
@@ -11,14 +19,75 @@ def read_lines(path: str) -> list[str]:
     with open(path, "r", encoding="utf-8", errors="replace") as f:
         return f.read().splitlines()
 
+def iter_lines(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for raw in f:
+            # splitlines, not rstrip: same line boundaries as read_lines.
+            yield from raw.splitlines()
+
+def read_head_lines(path: str, max_lines: int) -> list[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = (line for raw in f for line in raw.splitlines())
+        return list(islice(lines, max_lines))
+
 def write_text(path: str, text: str) -> None:
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
 def read_json(path: str) -> Any:
+    if orjson is not None:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN, huge ints, bad UTF-8 ...: let json accept or report them as before
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _has_nonfinite(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(v) for v in obj)
+    return False
+
+def _dumps_indented(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except (TypeError, orjson.JSONEncodeError):
+            data = None
+        # orjson writes NaN/Infinity as null where json writes them literally;
+        # only a payload with a null in it can need the slower check.
+        if data is not None and not (b"null" in data and _has_nonfinite(obj)):
+            return data
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
 def write_json(path: str, obj: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    data = _dumps_indented(obj)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def write_json_array(path: str, items: Iterable[Any]) -> int:
+    # Same layout as write_json(path, list(items)), but each item is serialised
+    # and written as it arrives. Goes through a temp file so a failure midway
+    # never leaves a truncated array at `path`.
+    tmp_path = path + ".tmp"
+    n = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for item in items:
+                f.write(b",\n  " if n else b"[\n  ")
+                # JSON strings never contain a raw newline, so this only re-indents.
+                f.write(_dumps_indented(item).replace(b"\n", b"\n  "))
+                n += 1
+            f.write(b"\n]" if n else b"[]")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return n
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
 @dataclass
 class Heading:
@@ -9,7 +9,7 @@ class Heading:
     text: str
     line_no: int
 
-def parse_headings(lines: List[str], max_headings: int = 80) -> List[Heading]:
+def parse_headings(lines: Iterable[str], max_headings: int = 80) -> List[Heading]:
     heads: List[Heading] = []
     for i, line in enumerate(lines, start=1):
         if line.startswith("#"):
@@ -27,16 +27,20 @@ def parse_headings(lines: List[str], max_headings: int = 80) -> List[Heading]:
 def extract_sections_by_headings(lines: List[str], wanted_headings: List[str], max_section_lines: int = 400) -> List[Tuple[int, int, str]]:
     headings = parse_headings(lines, max_headings=500)
     wanted_set = set(wanted_headings)
+    # One pass: a heading's section ends where the next heading of the same
+    # or higher level starts; open headings wait on a stack until then.
+    ends = [len(lines)] * len(headings)
+    stack: List[int] = []
+    for idx, h in enumerate(headings):
+        while stack and headings[stack[-1]].level >= h.level:
+            ends[stack.pop()] = h.line_no - 1
+        stack.append(idx)
     results: List[Tuple[int, int, str]] = []
     for idx, h in enumerate(headings):
         if h.text not in wanted_set:
             continue
         start = h.line_no
-        end = len(lines)
-        for h2 in headings[idx+1:]:
-            if h2.level <= h.level:
-                end = h2.line_no - 1
-                break
+        end = ends[idx]
         if end - start + 1 > max_section_lines:
             end = start + max_section_lines - 1
         chunk = "\n".join(lines[start-1:end])
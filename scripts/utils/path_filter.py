@@ -1,19 +1,50 @@
 #!/usr/bin/env python3
 from __future__ import annotations
+import os
 from dataclasses import dataclass
+from typing import Iterator, Tuple
 
-DEFAULT_IGNORE_DIRS = {
+DEFAULT_IGNORE_DIRS = frozenset({
     ".git", ".hg", ".svn",
     "node_modules", "dist", "build", "target", "vendor",
     "__pycache__", ".venv", "venv", ".idea", ".vscode",
-}
+})
 
 @dataclass(frozen=True)
 class PathFilter:
-    ignore_dirs: frozenset[str] = frozenset(DEFAULT_IGNORE_DIRS)
+    ignore_dirs: frozenset[str] = DEFAULT_IGNORE_DIRS
 
     def should_skip_dir(self, dirname: str) -> bool:
         return dirname in self.ignore_dirs
 
     def iter_filtered_dirs(self, dirnames: list[str]) -> list[str]:
         return [d for d in dirnames if not self.should_skip_dir(d)]
+
+    def iter_files(self, root: str) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Yield (relative posix path, DirEntry) for files under root in os.walk
+        top-down order, pruning ignored directories before descending.
+        Root-level dotfiles and dot-directories are skipped; nested ones are kept.
+        """
+        stack = [(root, "")]
+        while stack:
+            dir_path, rel_prefix = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                if not rel_prefix and entry.name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not self.should_skip_dir(entry.name) and not entry.is_symlink():
+                        subdirs.append((entry.path, rel_prefix + entry.name + "/"))
+                    continue
+                yield rel_prefix + entry.name, entry
+            stack.extend(reversed(subdirs))